@@ -0,0 +1,110 @@
+# benchmark_user_models.py
+"""Сравнение памяти и скорости: вложенные dict (старый get_user) против моделей из models.py.
+
+Запуск:
+    python benchmark_user_models.py --users 100000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from database import user_row_factory
+from models import User
+
+CITIES = ["Москва", "Санкт-Петербург", "Новосибирск", "Казань"]
+GENDERS = ["Мужской", "Женский"]
+
+
+def make_rows(users: int, seed: int) -> list[tuple]:
+    """Строки в формате SELECT из get_user."""
+    rng = random.Random(seed)
+    return [
+        (f"user{i}", rng.randint(18, 60), rng.choice(GENDERS), rng.choice(CITIES), "idle",
+         rng.choice(["any"] + GENDERS), 18, rng.randint(25, 60), rng.choice(["any"] + CITIES))
+        for i in range(users)
+    ]
+
+
+def dict_from_row(row: tuple) -> dict:
+    """Прежний формат get_user."""
+    return {
+        "profile": {
+            "name": row[0],
+            "age": int(row[1]) if row[1] else 0,
+            "gender": row[2],
+            "city": row[3]
+        },
+        "status": row[4],
+        "preferences": {
+            "gender": row[5],
+            "age_min": int(row[6]),
+            "age_max": int(row[7]),
+            "city": row[8]
+        }
+    }
+
+
+def measure_memory(build, rows: list[tuple]) -> tuple[list, int]:
+    tracemalloc.start()
+    objects = [build(row) for row in rows]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objects, size
+
+
+def time_build(build, rows: list[tuple], repeats: int = 3) -> float:
+    """Лучшее время создания из нескольких прогонов, без tracemalloc (он сильно замедляет аллокации)."""
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        objects = [build(row) for row in rows]
+        best = min(best, time.perf_counter() - started)
+        del objects
+    return best
+
+
+def time_dict_access(users: list[dict]) -> float:
+    started = time.perf_counter()
+    matches = 0
+    for u in users:
+        if u["preferences"]["age_min"] <= u["profile"]["age"] <= u["preferences"]["age_max"] \
+                and u["preferences"]["gender"] in ("any", u["profile"]["gender"]):
+            matches += 1
+    return time.perf_counter() - started
+
+
+def time_model_access(users: list[User]) -> float:
+    started = time.perf_counter()
+    matches = 0
+    for u in users:
+        if u.preferences.age_min <= u.profile.age <= u.preferences.age_max \
+                and u.preferences.gender in ("any", u.profile.gender):
+            matches += 1
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк моделей пользователя")
+    parser.add_argument("--users", type=int, default=100_000, help="число пользователей в кэше")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rows = make_rows(args.users, args.seed)
+
+    build_model = lambda row: user_row_factory(None, row)
+    dicts, dict_bytes = measure_memory(dict_from_row, rows)
+    models, model_bytes = measure_memory(build_model, rows)
+    dict_build = time_build(dict_from_row, rows)
+    model_build = time_build(build_model, rows)
+
+    print(f"👥 Пользователей: {args.users}")
+    print(f"🗄 Память:   dict {dict_bytes / 2**20:7.1f} МБ | модели {model_bytes / 2**20:7.1f} МБ "
+          f"({model_bytes / dict_bytes:.0%})")
+    print(f"🏗 Создание: dict {dict_build * 1000:7.0f} мс | модели {model_build * 1000:7.0f} мс")
+    print(f"🔎 Доступ:   dict {time_dict_access(dicts) * 1000:7.0f} мс | "
+          f"модели {time_model_access(models) * 1000:7.0f} мс")
+
+
+if __name__ == "__main__":
+    main()
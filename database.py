@@ -3,6 +3,8 @@ import sqlite3
 import logging
 from contextlib import contextmanager
 
+from models import Profile, Preferences, User
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -78,10 +80,20 @@ def add_user(user_id: int):
         """, (user_id,))
         conn.commit()
 
-def get_user(user_id: int) -> dict:
+def user_row_factory(cursor, row) -> User:
+    """Строит User прямо из строки запроса get_user."""
+    name, age, gender, city, status, pref_gender, min_age, max_age, filter_city = row
+    return User(
+        profile=Profile(name, int(age) if age else 0, gender, city),
+        status=status,
+        preferences=Preferences(pref_gender, int(min_age), int(max_age), filter_city)
+    )
+
+def get_user(user_id: int) -> User:
     """Возвращает данные пользователя и фильтры."""
     with get_db_connection() as conn:
         cursor = conn.cursor()
+        cursor.row_factory = user_row_factory
         cursor.execute("""
             SELECT u.name, u.age, u.gender, u.city, u.status,
                    f.preferred_gender, f.min_age, f.max_age, f.city AS filter_city
@@ -89,27 +101,12 @@ def get_user(user_id: int) -> dict:
             LEFT JOIN filters f ON u.user_id = f.user_id
             WHERE u.user_id = ?
         """, (user_id,))
-        row = cursor.fetchone()
-        if not row:
+        user = cursor.fetchone()
+        if not user:
             # Если нет — создаём
             add_user(user_id)
             return get_user(user_id)
-
-        return {
-            "profile": {
-                "name": row[0],
-                "age": int(row[1]) if row[1] else 0,
-                "gender": row[2],
-                "city": row[3]
-            },
-            "status": row[4],
-            "preferences": {
-                "gender": row[5],
-                "age_min": int(row[6]),
-                "age_max": int(row[7]),
-                "city": row[8]
-            }
-        }
+        return user
 
 def update_user(user_id: int, name: str, age: int, gender: str, city: str):
     """Обновляет профиль пользователя."""
@@ -157,24 +154,29 @@ def find_compatible(user_id: int) -> list:
         current_user = get_user(user_id)
         if not current_user:
             return []
+        # Поля текущего пользователя не меняются в цикле — читаем их один раз
+        prefs, profile = current_user.preferences, current_user.profile
+        want_gender, want_min, want_max = prefs.gender, prefs.age_min, prefs.age_max
+        any_city, want_city = prefs.city == "any", prefs.city.lower()
+        my_gender, my_age, my_city = profile.gender, profile.age, profile.city.lower()
         compatible = []
         for row in candidates:
             cand_id, name, age, gender, city, pref_gender, min_age, max_age, filter_city = row
 
             # 1. Проверяем: кандидат подходит под фильтры текущего
-            if current_user["preferences"]["gender"] != "any" and current_user["preferences"]["gender"] != gender:
+            if want_gender != "any" and want_gender != gender:
                 continue
-            if not (current_user["preferences"]["age_min"] <= age <= current_user["preferences"]["age_max"]):
+            if not (want_min <= age <= want_max):
                 continue
-            if current_user["preferences"]["city"] != "any" and current_user["preferences"]["city"].lower() != city.lower():
+            if not any_city and want_city != city.lower():
                 continue
 
             # 2. Проверяем: текущий подходит под фильтры кандидата
-            if pref_gender != "any" and current_user["profile"]["gender"] != pref_gender:
+            if pref_gender != "any" and my_gender != pref_gender:
                 continue
-            if not (min_age <= current_user["profile"]["age"] <= max_age):
+            if not (min_age <= my_age <= max_age):
                 continue
-            if filter_city != "any" and current_user["profile"]["city"].lower() != filter_city.lower():
+            if filter_city != "any" and my_city != filter_city.lower():
                 continue
 
             compatible.append({"user_id": cand_id})
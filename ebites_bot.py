@@ -2,18 +2,26 @@ import os
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher, types, F
+from aiogram.enums import ContentType
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
 from aiogram.filters import Command
 from aiogram.types import (
     ReplyKeyboardMarkup,
     KeyboardButton,
     InlineKeyboardMarkup,
-    InlineKeyboardButton
+    InlineKeyboardButton,
+    InputMediaPhoto,
+    InputMediaVideo,
+    InputMediaDocument,
+    InputMediaAudio
 )
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from dotenv import load_dotenv
 from flask import Flask
 
+from middlewares import UserSerializationMiddleware
+
 # Загрузка переменных окружения
 load_dotenv()
 
@@ -115,6 +123,16 @@ def get_back_button():
         resize_keyboard=True
     )
 
+# --- Middleware ---
+# Кнопки меню, повторные нажатия которых отбрасываются. Только с эмодзи:
+# обычные слова («Пол», «Город») собеседник может написать в чате дважды подряд
+MENU_BUTTONS = [
+    "👤 Мой профиль", "⚙️ Изменить фильтры", "🔍 Найти собеседника",
+    "🚪 Выйти из чата", "🔍 Отменить поиск", "🔙 Назад",
+    "✏️ Изменить имя", "📅 Изменить возраст", "⚧ Изменить пол", "🏙 Изменить город",
+]
+dp.update.outer_middleware(UserSerializationMiddleware(debounced_texts=MENU_BUTTONS))
+
 # --- /start ---
 @dp.message(Command("start"))
 async def cmd_start(message: types.Message, state: FSMContext):
@@ -132,18 +150,18 @@ async def cmd_start(message: types.Message, state: FSMContext):
 @dp.message(F.text == "👤 Мой профиль")
 async def profile_handler(message: types.Message, state: FSMContext):
     user = get_user(message.from_user.id)
-    if not user["profile"]["name"]:
+    if not user.profile.name:
         await message.answer("📝 Введите имя:")
         await state.set_state(ProfileStates.waiting_for_name)
         return
 
-    p = user["profile"]
+    p = user.profile
     text = (
         f"👤 <b>Ваш профиль</b>\n\n"
-        f"• Имя: {p['name']}\n"
-        f"• Возраст: {p['age']}\n"
-        f"• Пол: {p['gender']}\n"
-        f"• Город: {p['city']}\n\n"
+        f"• Имя: {p.name}\n"
+        f"• Возраст: {p.age}\n"
+        f"• Пол: {p.gender}\n"
+        f"• Город: {p.city}\n\n"
         f"🔧 Что хотите изменить?"
     )
     kb = ReplyKeyboardMarkup(
@@ -231,9 +249,9 @@ async def handle_city_choice(callback: types.CallbackQuery, state: FSMContext):
 
     data = await state.get_data()
     user_id = callback.from_user.id
-    name = data.get("name", get_user(user_id)["profile"]["name"])
-    age = data.get("age", get_user(user_id)["profile"]["age"])
-    gender = data.get("gender", get_user(user_id)["profile"]["gender"])
+    name = data.get("name", get_user(user_id).profile.name)
+    age = data.get("age", get_user(user_id).profile.age)
+    gender = data.get("gender", get_user(user_id).profile.gender)
 
     update_user(user_id, name, age, gender, city)
     set_status(user_id, "idle")
@@ -253,9 +271,9 @@ async def enter_city_manual(message: types.Message, state: FSMContext):
 
     data = await state.get_data()
     user_id = message.from_user.id
-    name = data.get("name", get_user(user_id)["profile"]["name"])
-    age = data.get("age", get_user(user_id)["profile"]["age"])
-    gender = data.get("gender", get_user(user_id)["profile"]["gender"])
+    name = data.get("name", get_user(user_id).profile.name)
+    age = data.get("age", get_user(user_id).profile.age)
+    gender = data.get("gender", get_user(user_id).profile.gender)
     update_user(user_id, name, age, gender, message.text)
     await message.answer("✅ Город обновлён!", reply_markup=get_main_menu())
     await state.clear()
@@ -346,16 +364,16 @@ async def set_city_filter(message: types.Message, state: FSMContext):
 async def start_search(message: types.Message):
     user_id = message.from_user.id
     user = get_user(user_id)
-    if user["status"] == "chatting":
+    if user.status == "chatting":
         await message.answer("Вы в чате!", reply_markup=get_in_chat_menu())
         return
-    if user["status"] == "searching":
+    if user.status == "searching":
         await message.answer("Вы уже ищете!", reply_markup=get_searching_menu())
         return
-    if not all([user["profile"]["name"],
-                user["profile"]["age"],
-                user["profile"]["gender"],
-                user["profile"]["city"]]):
+    if not all([user.profile.name,
+                user.profile.age,
+                user.profile.gender,
+                user.profile.city]):
         await message.answer("❌ Заполните профиль!")
         return
 
@@ -369,12 +387,12 @@ async def find_partner_with_timeout(user_id: int):
         # Этап 1: строгие фильтры (15 сек)
         for _ in range(3):
             await asyncio.sleep(5)
-            if get_user(user_id)["status"] != "searching":
+            if get_user(user_id).status != "searching":
                 return
             candidates = find_compatible(user_id)
             for cand in candidates:
                 companion_id = cand["user_id"]
-                if get_user(companion_id)["status"] == "searching":
+                if get_user(companion_id).status == "searching":
                     create_chat(user_id, companion_id)
                     set_status(user_id, "chatting")
                     set_status(companion_id, "chatting")
@@ -384,9 +402,9 @@ async def find_partner_with_timeout(user_id: int):
 
         # Этап 2: расширяем фильтры
         user = get_user(user_id)
-        if user["status"] != "searching":
+        if user.status != "searching":
             return
-        new_max_age = min(user["preferences"]["max_age"] + 10, 99)
+        new_max_age = min(user.preferences.age_max + 10, 99)
         update_filters(user_id, preferred_gender="any", max_age=new_max_age, city="any")
         await bot.send_message(
             user_id,
@@ -399,12 +417,12 @@ async def find_partner_with_timeout(user_id: int):
         # Этап 3: бесконечный поиск
         while True:
             await asyncio.sleep(3)
-            if get_user(user_id)["status"] != "searching":
+            if get_user(user_id).status != "searching":
                 return
             candidates = find_compatible(user_id)
             for cand in candidates:
                 companion_id = cand["user_id"]
-                if get_user(companion_id)["status"] == "searching":
+                if get_user(companion_id).status == "searching":
                     create_chat(user_id, companion_id)
                     set_status(user_id, "chatting")
                     set_status(companion_id, "chatting")
@@ -422,7 +440,7 @@ async def find_partner_with_timeout(user_id: int):
 @dp.message(F.text == "🔍 Отменить поиск")
 async def cancel_search(message: types.Message):
     user_id = message.from_user.id
-    if get_user(user_id)["status"] == "searching":
+    if get_user(user_id).status == "searching":
         set_status(user_id, "idle")
     await message.answer("Поиск остановлен.", reply_markup=get_main_menu())
 
@@ -442,30 +460,143 @@ async def exit_chat(message: types.Message):
     await message.answer("Вы вышли из чата.", reply_markup=get_main_menu())
 
 
-@dp.message(F.text)
+# Альбом приходит отдельными апдейтами с общим media_group_id —
+# копим их MEDIA_GROUP_WAIT секунд и отправляем одним send_media_group
+MEDIA_GROUP_WAIT = 0.5
+media_group_buffer: dict[str, list[types.Message]] = {}
+# Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора
+background_tasks: set[asyncio.Task] = set()
+# Фрагменты описаний TelegramBadRequest: чат собеседника недоступен
+PARTNER_GONE_ERRORS = ("chat not found", "peer_id_invalid", "user is deactivated")
+# ...и ошибки, вызванные самим содержимым сообщения
+UNSUPPORTED_CONTENT_ERRORS = ("can't be copied", "message to copy not found", "wrong file",
+                              "media_empty", "file is too big", "wrong type")
+# Сколько раз повторять отправку после 429 (TelegramRetryAfter)
+RELAY_RETRIES = 3
+
+# Типы, которые copy_message умеет копировать; служебные сообщения, опросы,
+# счета, розыгрыши и платные медиа в чат не пересылаются
+RELAYED_CONTENT_TYPES = [
+    ContentType.TEXT, ContentType.PHOTO, ContentType.VIDEO, ContentType.ANIMATION,
+    ContentType.DOCUMENT, ContentType.AUDIO, ContentType.VOICE, ContentType.VIDEO_NOTE,
+    ContentType.STICKER, ContentType.CONTACT, ContentType.LOCATION, ContentType.VENUE,
+    ContentType.DICE,
+]
+
+
+def build_input_media(message: types.Message):
+    """Собирает InputMedia по file_id сообщения, без повторной загрузки файла."""
+    caption = {"caption": message.caption, "caption_entities": message.caption_entities}
+    if message.photo:
+        return InputMediaPhoto(media=message.photo[-1].file_id,
+                               has_spoiler=message.has_media_spoiler, **caption)
+    if message.video:
+        return InputMediaVideo(media=message.video.file_id,
+                               has_spoiler=message.has_media_spoiler, **caption)
+    if message.document:
+        return InputMediaDocument(media=message.document.file_id, **caption)
+    if message.audio:
+        return InputMediaAudio(media=message.audio.file_id, **caption)
+    return None
+
+
+async def relay_message(comp_id: int, message: types.Message):
+    """Пересылает сообщение любого типа собеседнику (copy_message переиспользует file_id)."""
+    await bot.copy_message(chat_id=comp_id, from_chat_id=message.chat.id, message_id=message.message_id)
+
+
+async def handle_relay_error(message: types.Message, error: TelegramForbiddenError | TelegramBadRequest):
+    """Разрывает чат, если собеседник недоступен; иначе сообщает, что не так с сообщением."""
+    description = error.message.lower()
+    if isinstance(error, TelegramForbiddenError) or any(e in description for e in PARTNER_GONE_ERRORS):
+        await message.answer("❌ Собеседник отключился.")
+        await exit_chat(message)
+    elif any(e in description for e in UNSUPPORTED_CONTENT_ERRORS):
+        logger.warning(f"Сообщение не копируется: {error}")
+        await message.answer("⚠️ Такой тип сообщения не поддерживается.")
+    else:
+        logger.error(f"Ошибка пересылки сообщения: {error}")
+        await message.answer("❌ Не удалось доставить сообщение, попробуйте ещё раз.")
+
+
+async def deliver(message: types.Message, send) -> bool:
+    """Выполняет send() с повтором при 429; при ошибке сообщает отправителю message.
+
+    Возвращает True, если отправка прошла.
+    """
+    for attempt in range(RELAY_RETRIES + 1):
+        try:
+            await send()
+            return True
+        except TelegramRetryAfter as e:
+            if attempt == RELAY_RETRIES:
+                logger.error(f"Лимит Telegram не снят после {RELAY_RETRIES} повторов: {e}")
+                break
+            await asyncio.sleep(e.retry_after)
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            await handle_relay_error(message, e)
+            return False
+        except Exception as e:
+            logger.error(f"Ошибка пересылки сообщения: {e}")
+            break
+    await message.answer("❌ Не удалось доставить сообщение, попробуйте ещё раз.")
+    return False
+
+
+async def flush_media_group(media_group_id: str):
+    await asyncio.sleep(MEDIA_GROUP_WAIT)
+    messages = sorted(media_group_buffer.pop(media_group_id, []), key=lambda m: m.message_id)
+    if not messages:
+        return
+    first = messages[0]
+    try:
+        comp_id = get_companion(first.from_user.id)
+        if not comp_id:
+            await first.answer("Вы не в чате.", reply_markup=get_main_menu())
+            return
+        media = [build_input_media(m) for m in messages]
+        if len(media) >= 2 and all(media):
+            await deliver(first, lambda: bot.send_media_group(comp_id, media))
+            return
+        # Окно разрезало альбом или тип не поддерживается в группе
+        for m in messages:
+            if not await deliver(m, lambda m=m: relay_message(comp_id, m)):
+                return
+    except Exception as e:
+        # Задача фоновая — без этого ошибка потеряется в «Task exception was never retrieved»
+        logger.error(f"Ошибка отправки альбома {media_group_id}: {e}")
+
+
+@dp.message(F.content_type.in_(RELAYED_CONTENT_TYPES))
 async def chat_message(message: types.Message):
     if message.text == "🚪 Выйти из чата":
         return
+    group_id = message.media_group_id
+    if group_id and group_id in media_group_buffer:
+        media_group_buffer[group_id].append(message)
+        return
     user_id = message.from_user.id
     user = get_user(user_id)
-    if user["status"] != "chatting":
+    if user.status != "chatting":
+        return
+    if group_id:
+        media_group_buffer[group_id] = [message]
+        task = asyncio.create_task(flush_media_group(group_id))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
         return
     comp_id = get_companion(user_id)
     if not comp_id:
         await message.answer("Вы не в чате.", reply_markup=get_main_menu())
         return
-    try:
-        await bot.send_message(comp_id, message.text)
-    except Exception:
-        await message.answer("❌ Собеседник отключился.")
-        await exit_chat(message)
+    await deliver(message, lambda: relay_message(comp_id, message))
 
 
 # --- Запуск ---
 async def start_bot():
     init_db()
     print("🟢 Бот @anon_ebites_bot запущен!")
-    await dp.start_polling(bot)
+    await dp.start_polling(bot, handle_as_tasks=False)
 
 
 # Запуск Flask в отдельном потоке
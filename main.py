@@ -29,7 +29,10 @@ async def main():
     # Запускаем поллинг с обработкой ошибок
     while True:
         try:
-            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+            # handle_as_tasks=False: апдейты по очередям раскладывает UserSerializationMiddleware,
+            # а поллинг ждёт свободного места в них (backpressure)
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types(),
+                                   handle_as_tasks=False)
         except Exception as e:
             logging.error(f"Polling error: {e}, restarting in 5 seconds...")
             await asyncio.sleep(5)
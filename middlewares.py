@@ -0,0 +1,114 @@
+# middlewares.py
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Iterable, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Update, Dict[str, Any]], Awaitable[Any]]
+
+
+class UserSerializationMiddleware(BaseMiddleware):
+    """Очереди апдейтов по пользователям с ограничением принятых апдейтов.
+
+    • апдейты одного user_id выполняются строго по очереди: у каждого
+      пользователя своя deque и одна задача-обработчик, которая её разбирает;
+      очередь и задача удаляются, как только очередь опустела;
+    • апдейты разных пользователей обрабатываются параллельно;
+    • принятых, но ещё не обработанных апдейтов не больше max_pending. Когда
+      лимит исчерпан, middleware ждёт свободного места, а не отбрасывает апдейт;
+    • повторное нажатие той же кнопки (текст из debounced_texts или callback_data)
+      в течение debounce секунд отбрасывается — это единственное, что отбрасывается.
+
+    Рассчитан на start_polling(..., handle_as_tasks=False): тогда поллинг ждёт,
+    пока апдейт будет принят в очередь, и при заполненной очереди перестаёт
+    забирать новые апдейты у Telegram — это и есть backpressure. С
+    handle_as_tasks=True aiogram сам создаёт задачу на каждый апдейт, и
+    max_pending ограничивает лишь число одновременно обрабатываемых апдейтов.
+
+    SimpleEventIsolation из aiogram тоже сериализует по пользователю, но хранит
+    замок на каждого пользователя бессрочно и не ограничивает общую очередь.
+    """
+
+    def __init__(
+        self,
+        max_pending: int = 256,
+        debounce: float = 1.0,
+        debounced_texts: Iterable[str] = (),
+    ):
+        self.capacity = asyncio.Semaphore(max_pending)
+        self.debounce = debounce
+        self.debounced_texts = frozenset(debounced_texts)
+        self._queues: Dict[Hashable, Deque[Tuple[Handler, Update, Dict[str, Any]]]] = {}
+        self._workers: set[asyncio.Task] = set()
+        self._last_tap: Dict[int, tuple[str, float]] = {}
+
+    async def __call__(self, handler: Handler, event: Update, data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        if user is not None:
+            key = user.id
+            tap = self._tap_key(event)
+            if tap is not None and self._is_duplicate(user.id, tap):
+                logger.info(f"Повторное нажатие от {user.id} отброшено: {tap}")
+                if event.callback_query:
+                    await self._ack(event)
+                return None
+        else:
+            # Апдейты без пользователя ни с чем не сериализуем
+            key = ("update", event.update_id)
+
+        await self.capacity.acquire()
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            worker = asyncio.create_task(self._drain(key, queue))
+            self._workers.add(worker)
+            worker.add_done_callback(self._workers.discard)
+        queue.append((handler, event, data))
+        return None
+
+    async def _drain(self, key: Hashable, queue: Deque[Tuple[Handler, Update, Dict[str, Any]]]):
+        """Разбирает очередь одного пользователя по порядку."""
+        while queue:
+            handler, event, data = queue.popleft()
+            try:
+                await handler(event, data)
+            except Exception:
+                logger.exception(f"Ошибка обработки апдейта {event.update_id}")
+            finally:
+                self.capacity.release()
+        # Очередь пуста — освобождаем состояние пользователя
+        del self._queues[key]
+
+    def _tap_key(self, event: Update) -> str | None:
+        if event.message and event.message.text in self.debounced_texts:
+            return f"text:{event.message.text}"
+        if event.callback_query and event.callback_query.data:
+            return f"callback:{event.callback_query.data}"
+        return None
+
+    def _is_duplicate(self, user_id: int, tap: str) -> bool:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        last = self._last_tap.get(user_id)
+        self._last_tap[user_id] = (tap, now)
+        # Запись нужна только debounce секунд — потом удаляем, чтобы словарь не рос
+        loop.call_later(self.debounce, self._forget_tap, user_id, now)
+        return last is not None and last[0] == tap and now - last[1] < self.debounce
+
+    def _forget_tap(self, user_id: int, tapped_at: float):
+        last = self._last_tap.get(user_id)
+        if last is not None and last[1] == tapped_at:
+            del self._last_tap[user_id]
+
+    @staticmethod
+    async def _ack(event: Update):
+        """Гасит «часики» на инлайн-кнопке у отброшенного callback."""
+        try:
+            await event.callback_query.answer()
+        except Exception as e:
+            logger.warning(f"Не удалось ответить на callback: {e}")
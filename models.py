@@ -0,0 +1,29 @@
+# models.py
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class Profile:
+    """Анкета пользователя."""
+    name: str
+    age: int
+    gender: str
+    city: str
+
+
+@dataclass(slots=True)
+class Preferences:
+    """Фильтры поиска собеседника."""
+    gender: str
+    age_min: int
+    age_max: int
+    city: str
+
+
+@dataclass(slots=True)
+class User:
+    """Пользователь: анкета, статус (idle, searching, chatting) и фильтры."""
+    profile: Profile
+    status: str
+    preferences: Preferences
+
@@ -0,0 +1,263 @@
+# simulate_matchmaking.py
+"""Детерминированная симуляция подбора собеседников.
+
+Гоняет find_partner_with_timeout на виртуальных часах: asyncio.sleep(5)/sleep(3)
+не ждут реального времени, а мгновенно переводят часы цикла к следующему таймеру.
+База — SQLite в памяти, бот заменён заглушкой, которая только запоминает сообщения.
+
+Запуск:
+    python simulate_matchmaking.py --users 2000 --seed 42
+
+Код выхода 1, если в поиске были ошибки или никто не дошёл до этапа 3.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+os.environ.setdefault("BOT_TOKEN", "0:simulation")
+
+import database
+import ebites_bot
+
+CITIES = ["Москва", "Санкт-Петербург", "Новосибирск", "Казань"]
+GENDERS = ["Мужской", "Женский"]
+BUCKETS = [5, 10, 15, 30, 60, 120, 300]
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """Цикл событий с виртуальным временем.
+
+    Когда готовых к запуску задач нет, часы перескакивают к ближайшему
+    запланированному таймеру, поэтому сон любой длины занимает ~0 реального времени.
+
+    Опирается на внутренности BaseEventLoop (_run_once, _ready, _scheduled),
+    проверено на Python 3.11 — той же версии, что в Dockerfile.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._virtual_time = 0.0
+
+    def time(self):
+        return self._virtual_time
+
+    def _run_once(self):
+        if not self._ready and self._scheduled:
+            self._virtual_time = max(self._virtual_time, self._scheduled[0].when())
+        super()._run_once()
+
+
+class FakeBot:
+    """Заглушка aiogram.Bot: фиксирует время находки и расширения поиска."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.matched_at: dict[int, float] = {}
+        self.widened: set[int] = set()
+        self.errors = 0
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        if text.startswith("🎉"):
+            self.matched_at.setdefault(chat_id, self.loop.time())
+        elif text.startswith("🔍 Расширяем"):
+            self.widened.add(chat_id)
+        elif text.startswith("❌"):
+            self.errors += 1
+
+
+def memory_connection_factory(uri: str):
+    """Подменяет database.get_db_connection: соединения к разделяемой БД в памяти."""
+
+    @contextmanager
+    def memory_connection():
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        try:
+            conn.execute("PRAGMA foreign_keys = ON;")
+            yield conn
+        finally:
+            conn.close()
+
+    return memory_connection
+
+
+class QueryCounter:
+    """Считает соединения и SQL-запросы (без PRAGMA) через trace callback."""
+
+    def __init__(self):
+        self.connections = 0
+        self.queries = Counter()
+
+    def __call__(self, statement: str):
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if verb != "PRAGMA":
+            self.queries[verb] += 1
+
+    def install(self):
+        original = database.get_db_connection
+
+        @contextmanager
+        def counting_connection():
+            with original() as conn:
+                self.connections += 1
+                conn.set_trace_callback(self)
+                yield conn
+
+        database.get_db_connection = counting_connection
+
+
+def populate(rng: random.Random, users: int):
+    """Создаёт пользователей со случайными профилями и фильтрами."""
+    with database.get_db_connection() as conn:
+        for user_id in range(1, users + 1):
+            gender = rng.choice(GENDERS)
+            age = rng.randint(18, 60)
+            city = rng.choice(CITIES)
+            min_age = rng.randint(18, max(18, age - 5))
+            max_age = rng.randint(min(age + 5, 60), 60)
+            conn.execute(
+                "INSERT INTO users (user_id, name, age, gender, city, status) VALUES (?, ?, ?, ?, ?, 'idle')",
+                (user_id, f"user{user_id}", age, gender, city),
+            )
+            conn.execute(
+                "INSERT INTO filters (user_id, preferred_gender, min_age, max_age, city) VALUES (?, ?, ?, ?, ?)",
+                (user_id,
+                 rng.choice(["any"] + GENDERS),
+                 min_age,
+                 max_age,
+                 rng.choice(["any", city])),
+            )
+        conn.commit()
+
+
+async def run_simulation(users: int, seed: int, arrival_window: float, horizon: float) -> dict:
+    loop = asyncio.get_running_loop()
+    rng = random.Random(seed)
+    fake_bot = FakeBot(loop)
+    ebites_bot.bot = fake_bot
+
+    populate(rng, users)
+    counter = QueryCounter()
+    counter.install()
+
+    # Пользователи нажимают «Найти собеседника» в случайные моменты окна прихода
+    arrivals = sorted((rng.uniform(0, arrival_window), user_id) for user_id in range(1, users + 1))
+    started_at: dict[int, float] = {}
+    tasks = []
+    for arrive, user_id in arrivals:
+        await asyncio.sleep(arrive - loop.time())
+        database.set_status(user_id, "searching")
+        started_at[user_id] = loop.time()
+        tasks.append(asyncio.create_task(ebites_bot.find_partner_with_timeout(user_id)))
+
+    # Этап 3 бесконечен — оставшихся ищущих снимаем по горизонту симуляции
+    await asyncio.sleep(max(0.0, horizon - loop.time()))
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    waits = {
+        user_id: fake_bot.matched_at[user_id] - started_at[user_id]
+        for user_id in fake_bot.matched_at
+    }
+    return {
+        "waits": waits,
+        "widened": fake_bot.widened,
+        "errors": fake_bot.errors,
+        "connections": counter.connections,
+        "queries": counter.queries,
+        "virtual_time": loop.time(),
+    }
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def simulate(users: int, seed: int, arrival_window: float, horizon: float) -> tuple[dict, float]:
+    """Готовит БД в памяти и виртуальный цикл, прогоняет симуляцию.
+
+    Возвращает результат и затраченное реальное время в секундах.
+    """
+    original_connection, original_bot = database.get_db_connection, ebites_bot.bot
+    # Разделяемая БД в памяти живёт, пока открыто хотя бы одно соединение
+    uri = f"file:ebites_sim_{seed}?mode=memory&cache=shared"
+    anchor = sqlite3.connect(uri, uri=True)
+    database.get_db_connection = memory_connection_factory(uri)
+    loop = VirtualTimeLoop()
+    asyncio.set_event_loop(loop)
+    started = time.perf_counter()
+    try:
+        database.init_db()
+        result = loop.run_until_complete(run_simulation(users, seed, arrival_window, horizon))
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+        anchor.close()
+        database.get_db_connection, ebites_bot.bot = original_connection, original_bot
+    return result, time.perf_counter() - started
+
+
+def check_result(result: dict) -> list[str]:
+    """Возвращает список нарушений, на которых симуляция должна падать."""
+    problems = []
+    if result["errors"]:
+        problems.append(f"ошибок поиска: {result['errors']}")
+    if not result["widened"]:
+        problems.append("ни один поиск не дошёл до этапа 3")
+    return problems
+
+
+def print_report(users: int, result: dict, real_seconds: float):
+    waits = result["waits"]
+    values = list(waits.values())
+    by_stage = Counter("этап 3" if user_id in result["widened"] else "этап 1" for user_id in waits)
+    total_queries = sum(result["queries"].values())
+
+    print(f"👥 Ищущих: {users}, нашли пару: {len(values)}, без пары: {users - len(values)}")
+    print(f"   по этапам: {dict(by_stage)}, ошибок поиска: {result['errors']}")
+    if values:
+        print(f"⏱ Время до пары (вирт. сек): "
+              f"mean={statistics.fmean(values):.1f} "
+              f"p50={percentile(values, 0.5):.1f} "
+              f"p90={percentile(values, 0.9):.1f} "
+              f"p99={percentile(values, 0.99):.1f} "
+              f"max={max(values):.1f}")
+        lower = 0
+        for upper in BUCKETS + [float("inf")]:
+            count = sum(lower < v <= upper for v in values)
+            label = f"{lower}–{upper}" if upper != float("inf") else f">{lower}"
+            print(f"   {label:>8}: {count:6d} {'#' * (50 * count // len(values))}")
+            lower = upper
+    print(f"🗄 Соединений с БД: {result['connections']}, запросов: {total_queries} "
+          f"({dict(result['queries'])})")
+    if values:
+        print(f"   запросов на найденную пару: {total_queries / len(values):.1f}")
+    print(f"🕒 Виртуальное время: {result['virtual_time']:.0f} c, реальное: {real_seconds * 1000:.0f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Симуляция подбора собеседников на виртуальных часах")
+    parser.add_argument("--users", type=int, default=1000, help="число ищущих пользователей")
+    parser.add_argument("--seed", type=int, default=1, help="seed генератора профилей и прихода")
+    parser.add_argument("--arrival-window", type=float, default=60.0, help="окно прихода ищущих, сек")
+    parser.add_argument("--horizon", type=float, default=300.0, help="длительность симуляции, сек")
+    args = parser.parse_args()
+
+    result, real_seconds = simulate(args.users, args.seed, args.arrival_window, args.horizon)
+    print_report(args.users, result, real_seconds)
+    problems = check_result(result)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# test_middlewares.py
+import asyncio
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Chat, Message, Update, User
+
+from middlewares import UserSerializationMiddleware
+
+
+def make_update(update_id: int, user_id: int, text: str) -> Update:
+    return Update(update_id=update_id, message=Message(
+        message_id=update_id,
+        date=0,
+        chat=Chat(id=user_id, type="private"),
+        from_user=User(id=user_id, is_bot=False, first_name="test"),
+        text=text,
+    ))
+
+
+def user_data(user_id: int) -> dict:
+    return {"event_from_user": User(id=user_id, is_bot=False, first_name="test")}
+
+
+async def drain(middleware: UserSerializationMiddleware):
+    while middleware._workers:
+        await asyncio.gather(*middleware._workers)
+
+
+def test_updates_of_one_user_run_in_order_and_users_run_in_parallel():
+    async def scenario():
+        middleware = UserSerializationMiddleware()
+        running: dict[int, int] = {}
+        peak_total = 0
+        log = []
+
+        async def handler(event, data):
+            nonlocal peak_total
+            user_id = data["event_from_user"].id
+            running[user_id] = running.get(user_id, 0) + 1
+            assert running[user_id] == 1, "два апдейта одного пользователя выполняются одновременно"
+            peak_total = max(peak_total, sum(running.values()))
+            await asyncio.sleep(0.01)
+            log.append((user_id, event.update_id))
+            running[user_id] -= 1
+
+        for update_id, user_id in enumerate([1, 1, 2, 1, 2], start=1):
+            await middleware(handler, make_update(update_id, user_id, f"msg{update_id}"), user_data(user_id))
+        await drain(middleware)
+
+        assert [u for u in log if u[0] == 1] == [(1, 1), (1, 2), (1, 4)]
+        assert [u for u in log if u[0] == 2] == [(2, 3), (2, 5)]
+        assert peak_total == 2
+        assert middleware._queues == {}
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_button_taps_are_dropped_but_repeated_text_is_not():
+    async def scenario():
+        middleware = UserSerializationMiddleware(debounce=0.05, debounced_texts=["🔍 Найти собеседника"])
+        handled = []
+
+        async def handler(event, data):
+            handled.append(event.message.text)
+
+        for update_id, text in enumerate(["🔍 Найти собеседника", "🔍 Найти собеседника", "Город", "Город"]):
+            await middleware(handler, make_update(update_id, 1, text), user_data(1))
+        await drain(middleware)
+        assert handled == ["🔍 Найти собеседника", "Город", "Город"]
+
+        # Записи о нажатиях удаляются после окна debounce
+        await asyncio.sleep(0.1)
+        assert middleware._last_tap == {}
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_waits_instead_of_dropping():
+    async def scenario():
+        middleware = UserSerializationMiddleware(max_pending=2)
+        release = asyncio.Event()
+        handled = []
+
+        async def handler(event, data):
+            await release.wait()
+            handled.append(event.update_id)
+
+        # Альбом из 10 фото при лимите 2: лишние апдейты ждут, но не теряются
+        accepting = asyncio.gather(*(
+            middleware(handler, make_update(update_id, 1, "photo"), user_data(1))
+            for update_id in range(10)
+        ))
+        await asyncio.sleep(0.01)
+        assert not accepting.done(), "при заполненной очереди приём апдейтов должен ждать"
+
+        release.set()
+        await accepting
+        await drain(middleware)
+        assert handled == list(range(10))
+
+    asyncio.run(scenario())
+
+
+def test_dispatcher_feeds_updates_through_the_middleware():
+    async def scenario():
+        dp = Dispatcher()
+        middleware = UserSerializationMiddleware()
+        dp.update.outer_middleware(middleware)
+        handled = []
+
+        @dp.message()
+        async def echo(message: Message):
+            handled.append(message.text)
+
+        bot = Bot(token="42:TEST")
+        for update_id, text in enumerate(["a", "b", "c"]):
+            await dp.feed_update(bot, make_update(update_id, 7, text))
+        await drain(middleware)
+        await bot.session.close()
+        assert handled == ["a", "b", "c"]
+
+    asyncio.run(scenario())
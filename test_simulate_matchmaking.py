@@ -0,0 +1,24 @@
+# test_simulate_matchmaking.py
+from simulate_matchmaking import check_result, simulate
+
+USERS = 300
+SEED = 7
+
+
+def run():
+    result, _ = simulate(users=USERS, seed=SEED, arrival_window=60.0, horizon=300.0)
+    return result
+
+
+def test_simulation_has_no_search_errors_and_reaches_stage_3():
+    result = run()
+    assert check_result(result) == []
+    assert result["waits"], "никто не нашёл пару"
+    assert any(user_id in result["widened"] for user_id in result["waits"]), \
+        "никто не нашёл пару на этапе 3"
+
+
+def test_simulation_is_deterministic_for_the_same_seed():
+    first, second = run(), run()
+    for key in ("waits", "widened", "errors", "connections", "queries", "virtual_time"):
+        assert first[key] == second[key], key